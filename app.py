@@ -10,11 +10,30 @@ from components.logger_config import setup_logging, get_logger
 setup_logging()
 logger = get_logger(__name__)
 
-# Create database instance
-db = Database('./db/tickcapturejobs.db')
-subscription_handler = None
-subscription_thread = None
+# Create database instance once per process; st.cache_resource keeps it
+# alive across Streamlit reruns so the hot path skips connection setup
+@st.cache_resource
+def get_db():
+    return Database('./db/tickcapturejobs.db')
+
+db = get_db()
+
+# st.cache_resource memoizes across reruns and sessions, so the handler
+# and its thread are created exactly once per process
+@st.cache_resource
+def get_subscription_handler():
+    logger.info("Starting SubscriptionHandler")
+    try:
+        handler = SubscriptionHandler.get_instance("config/bpipe_config.local.json")
+        threading.Thread(target=handler.start, daemon=True).start()
+        return handler
+    except Exception as e:
+        logger.error(f"Error starting SubscriptionHandler: {str(e)}", exc_info=True)
+        return None
 
+# Cache the recent-jobs DataFrame so reruns triggered by widget interaction
+# don't re-run the SQL; inserts and deletes invalidate it explicitly
+@st.cache_data(ttl=30)
 def query_data():
     logger.info("Querying recent jobs")
     try:
@@ -24,14 +43,31 @@ def query_data():
         st.error("Error querying recent jobs. Please try again.")
         return pd.DataFrame()
 
+def set_jobs_df(df):
+    # Build the checkbox-augmented view once per data refresh instead of
+    # copying the DataFrame on every rerun
+    st.session_state.df = df
+    df_edit = df.copy()
+    df_edit.insert(0, 'Select', False)
+    st.session_state.df_edit = df_edit
+
+def notify_subscription_handler():
+    # Wake the subscription manager immediately instead of waiting for
+    # its next poll of the update flag
+    handler = get_subscription_handler()
+    if handler is not None:
+        handler.notify_change()
+
 def insert_data(job_name, job_startdatetime, job_enddatetime, instruments, fields):
     logger.info(f"Inserting new job: {job_name}")
     try:
         # Store timestamps in UTC without conversion
         db.insert_data(job_name, job_startdatetime, job_enddatetime, instruments, fields)
         db.set_update_flag()
+        notify_subscription_handler()
+        query_data.clear()
         if 'df' in st.session_state:
-            st.session_state.df = query_data()
+            set_jobs_df(query_data())
     except Exception as e:
         logger.error(f"Error inserting data: {e}", exc_info=True)
         raise
@@ -39,36 +75,20 @@ def insert_data(job_name, job_startdatetime, job_enddatetime, instruments, field
 def delete_selected_jobs(job_ids):
     logger.info(f"Deleting jobs with IDs: {job_ids}")
     try:
-        for job_id in job_ids:
-            db.delete_job(job_id)
+        db.delete_jobs(job_ids)
         # Set the update flag to notify subscription handler
         db.set_update_flag()
+        notify_subscription_handler()
+        query_data.clear()
         # Force refresh of the dataframe
         if 'df' in st.session_state:
-            st.session_state.df = query_data()
+            set_jobs_df(query_data())
     except Exception as e:
         logger.error(f"Error deleting jobs: {e}", exc_info=True)
         raise
 
-def run_subscription_handler():
-    global subscription_handler
-    logger.info("Starting SubscriptionHandler")
-    try:
-        if subscription_handler is None:
-            subscription_handler = SubscriptionHandler("config/bpipe_config.local.json")
-            subscription_handler.start()
-        else:
-            logger.info("SubscriptionHandler already running")
-    except Exception as e:
-        logger.error(f"Error starting SubscriptionHandler: {str(e)}", exc_info=True)
-
 def main():
-    global subscription_thread
-    
-    if subscription_thread is None:
-        logger.info("Initializing SubscriptionHandler thread")
-        subscription_thread = threading.Thread(target=run_subscription_handler)
-        subscription_thread.start()
+    get_subscription_handler()
 
     st.title("Job Management")
 
@@ -77,18 +97,15 @@ def main():
     
     # Initialize the dataframe if it doesn't exist
     if 'df' not in st.session_state:
-        st.session_state.df = query_data()
-
-    # Add a checkbox column to the dataframe
-    df_with_checkboxes = st.session_state.df.copy()
-    df_with_checkboxes.insert(0, 'Select', False)
+        set_jobs_df(query_data())
 
     # Use st.data_editor for an editable dataframe with checkboxes
-    edited_df = st.data_editor(df_with_checkboxes, hide_index=True, disabled=df_with_checkboxes.columns[1:])
+    edited_df = st.data_editor(st.session_state.df_edit, hide_index=True, disabled=st.session_state.df_edit.columns[1:])
 
     # Add a refresh button
     if st.button('Refresh Jobs'):
-        st.session_state.df = query_data()
+        query_data.clear()
+        set_jobs_df(query_data())
         st.rerun()
 
     # Add a delete button
@@ -107,20 +124,24 @@ def main():
 
     with st.form("job_form"):
         # Input fields with UTC timezone
+        # Capture the clock once per rerun and derive every default from it
+        now = datetime.now(UTC)
+        today = now.date()
+
         job_name = st.text_input("Job Name")
-        job_startdatetime = st.date_input("Job Start Date", datetime.now(UTC))
-        current_time = datetime.now(UTC)
+        job_startdatetime = st.date_input("Job Start Date", today)
 
         # Calculate the nearest quarter of the hour in the future
-        minutes = (current_time.minute // 5 + 1) * 5
+        minutes = (now.minute // 5 + 1) * 5
+        rounded = now
         if minutes == 60:
             minutes = 0
-            current_time = current_time.replace(hour=current_time.hour + 1)
-        default_start_time = current_time.replace(minute=minutes, second=0, microsecond=0).time()
-        default_end_time = (datetime.combine(datetime.today(), default_start_time).replace(tzinfo=UTC) + timedelta(minutes=15)).time()
+            rounded = now.replace(hour=now.hour + 1)
+        default_start_time = rounded.replace(minute=minutes, second=0, microsecond=0).time()
+        default_end_time = (datetime.combine(today, default_start_time).replace(tzinfo=UTC) + timedelta(minutes=15)).time()
 
         job_starttime = st.time_input("Job Start Time (UTC)", default_start_time, step=timedelta(minutes=5))
-        job_enddatetime = st.date_input("Job End Date", datetime.now(UTC))
+        job_enddatetime = st.date_input("Job End Date", today)
         job_endtime = st.time_input("Job End Time (UTC)", default_end_time, step=timedelta(minutes=5))
         instruments = st.text_area("Instruments (one per line)", height=100)
         fields = st.text_area("Fields (one per line)", height=100)
@@ -153,14 +174,14 @@ def main():
                 try:
                     job_startdatetime = job_startdatetime_combined.timestamp()
                     job_enddatetime = job_enddatetime_combined.timestamp()
-                    instruments_list = [i.strip() for i in instruments.split('\n') if i.strip()]
-                    fields_list = [f.strip() for f in fields.split('\n') if f.strip()]
+                    # splitlines handles CR/LF and strips happen in one pass
+                    instruments_list = [s for s in map(str.strip, instruments.splitlines()) if s]
+                    fields_list = [s for s in map(str.strip, fields.splitlines()) if s]
                     
                     insert_data(job_name, job_startdatetime, job_enddatetime, instruments_list, fields_list)
                     st.success("Job added successfully!")
-                    
-                    # Refresh the dataframe immediately
-                    st.session_state.df = query_data()
+
+                    # insert_data already refreshed the dataframe
                     st.rerun()
                 except Exception as e:
                     logger.error(f"Error submitting job: {e}", exc_info=True)
@@ -3,6 +3,12 @@ from logging.handlers import RotatingFileHandler
 import os
 
 def setup_logging(log_file='logs/app.log', log_level=logging.DEBUG):
+    # Streamlit re-executes the calling module on every rerun; skip the
+    # handler teardown/re-add cycle once logging is configured
+    root_logger = logging.getLogger()
+    if getattr(root_logger, '_app_configured', False):
+        return
+
     # Create a logs directory if it doesn't exist
     os.makedirs('logs', exist_ok=True)
 
@@ -20,8 +26,7 @@ def setup_logging(log_file='logs/app.log', log_level=logging.DEBUG):
     console_handler = logging.StreamHandler()
     console_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
 
-    # Get the root logger and set its level
-    root_logger = logging.getLogger()
+    # Set the root logger level
     root_logger.setLevel(log_level)
 
     # Remove any existing handlers to avoid duplication
@@ -32,5 +37,7 @@ def setup_logging(log_file='logs/app.log', log_level=logging.DEBUG):
     root_logger.addHandler(file_handler)
     root_logger.addHandler(console_handler)
 
+    root_logger._app_configured = True
+
 def get_logger(name):
     return logging.getLogger(name)
@@ -1,5 +1,8 @@
 import blpapi as bp
+import functools
 import json
+import logging
+import queue
 from pprint import pprint,pformat
 import time
 import threading
@@ -7,69 +10,88 @@ from db.database import Database
 import datetime
 from typing import Dict, List, Any, Optional
 from components.logger_config import get_logger
+from models.activejob import ActiveJob
 from models.subscriptionitem import SubscriptionItem
 
 logger = get_logger(__name__)
 
+@functools.lru_cache(maxsize=4)
+def _load_tls(pk12path: str, pk7path: str) -> tuple:
+    # TLS material is immutable for the life of the process; cache the
+    # blobs so repeated handler construction skips the disk reads
+    with open(pk12path, 'rb') as pk12File:
+        pk12Blob = pk12File.read()
+    with open(pk7path, 'rb') as pk7File:
+        pk7Blob = pk7File.read()
+    return pk12Blob, pk7Blob
+
 class SubscriptionHandler:
     _instance: Optional['SubscriptionHandler'] = None
     _lock = threading.Lock()
 
-    def __new__(cls, config_path: str) -> 'SubscriptionHandler':
+    @classmethod
+    def get_instance(cls, config_path: str, poll_interval: Optional[float] = None) -> 'SubscriptionHandler':
+        # Double-checked locking: the common case is a plain attribute read
+        # with no lock acquisition
+        instance = cls._instance
+        if instance is not None:
+            return instance
         with cls._lock:
             if cls._instance is None:
                 logger.info("Creating new SubscriptionHandler instance")
-                cls._instance = super().__new__(cls)
-                cls._instance._initialized = False
+                cls._instance = cls(config_path, poll_interval)
             return cls._instance
 
-    def __init__(self, config_path: str):
-        if self._initialized:
-            logger.debug("SubscriptionHandler already initialized, skipping initialization")
-            return
-            
+    def __init__(self, config_path: str, poll_interval: Optional[float] = None):
         logger.info(f"Initializing SubscriptionHandler with config: {config_path}")
 
         self._session = None
         self._sessionOptions = None
-        self._subscription_list = bp.SubscriptionList()  # Single SubscriptionList instance
         self._active_instruments: Dict[str, SubscriptionItem] = {}  # Track active instruments
+        self._instrument_refcount: Dict[str, int] = {}  # How many active jobs use each instrument
+        # Each instrument's CorrelationId (and its SubscriptionItem) is
+        # allocated once per process and reused across re-subscriptions
+        self._cid_pool: Dict[str, bp.CorrelationId] = {}
+        # Guards mutations of the subscription state above; the blpapi
+        # callback thread only does single-key dict reads, which are atomic,
+        # so the read side stays lock-free
+        self._sub_lock = threading.RLock()
 
         try:
             with open(config_path, 'r') as f:
                 self._config = json.load(f)
-            logger.debug(f"Loaded configuration: {pformat(self._config)}")
-
-            self._sessionOptions = bp.SessionOptions()
-            for i, host in enumerate(self._config['hosts']):
-                self._sessionOptions.setServerAddress(host['addr'], host['port'], i)
-            
-            if 'appname' not in self._config or not self._config['appname']:
-                raise ValueError("ApplicationName is required in the configuration")
-            
-            authOpts = bp.AuthOptions.createWithApp(appName=self._config['appname'])
-            self._sessionOptions.setSessionIdentityOptions(authOpts)
-
-            if "tlsInfo" in self._config:
-                tlsInfo = self._config["tlsInfo"]
-                pk12Blob = None
-                pk7Blob = None
-                with open(tlsInfo['pk12path'], 'rb') as pk12File:
-                    pk12Blob = pk12File.read()
-                with open(tlsInfo['pk7path'], 'rb') as pk7File:
-                    pk7Blob = pk7File.read()
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Loaded configuration: %s", pformat(self._config))
 
-                self._sessionOptions.setTlsOptions(bp.TlsOptions.createFromBlobs(pk12Blob, tlsInfo['password'], pk7Blob))
-
-            self._session = bp.Session(self._sessionOptions, self.eventHandler)
-            self._session.startAsync()
+            self._sessionOptions = self._build_session_options(self._config)
 
             self.db: Database = Database('./db/tickcapturejobs.db')
             self.active_subscriptions: Dict[int, List[str]] = {}  # Store job_id -> list of instruments
             self.stop_event: threading.Event = threading.Event()
-            self.job_cache: Dict[int, Dict[str, Any]] = {}
+            self.update_event: threading.Event = threading.Event()
+            self.job_cache: Dict[int, ActiveJob] = {}
             self.last_cache_update: float = 0
             self.cache_update_interval: int = 60
+            # Optional cap on how long the manager sleeps between wakes; None
+            # means sleep until the next cache refresh or a change event
+            self.poll_interval: Optional[float] = poll_interval
+            self._next_refresh: float = 0.0  # monotonic deadline for the next cache refresh
+
+            # Inbound tick queue: the blpapi dispatcher thread only enqueues;
+            # a dedicated consumer drains in batches so a slow consumer never
+            # stalls event delivery. Everything eventHandler touches must
+            # exist before the session starts delivering events
+            self._inbound: queue.SimpleQueue = queue.SimpleQueue()
+            self._consumer_thread: threading.Thread = threading.Thread(
+                target=self._drain_inbound,
+                name="SubscriptionDataConsumerThread"
+            )
+            self._consumer_thread.daemon = True
+            self._consumer_thread.start()
+
+            self._session = bp.Session(self._sessionOptions, self.eventHandler)
+            self._session.startAsync()
+
             self.subscription_thread: threading.Thread = threading.Thread(
                 target=self.manage_subscriptions,
                 name="SubscriptionManagerThread"
@@ -77,127 +99,197 @@ class SubscriptionHandler:
             self.subscription_thread.daemon = True
             self.subscription_thread.start()
 
-            self._initialized = True
             logger.info("SubscriptionHandler initialization completed")
 
         except Exception as e:
             logger.error(f"Error initializing SubscriptionHandler: {str(e)}", exc_info=True)
             raise
 
-    def start_subscription(self, job: Dict[str, Any]) -> None:
-        logger.debug(f"Starting subscription for job {job['id']} with instruments: {job['instruments']} and fields: {job['fields']}")
-        
+    @classmethod
+    def _build_session_options(cls, config: Dict[str, Any]) -> bp.SessionOptions:
+        sessionOptions = bp.SessionOptions()
+        for i, host in enumerate(config['hosts']):
+            sessionOptions.setServerAddress(host['addr'], host['port'], i)
+
+        if 'appname' not in config or not config['appname']:
+            raise ValueError("ApplicationName is required in the configuration")
+
+        authOpts = bp.AuthOptions.createWithApp(appName=config['appname'])
+        sessionOptions.setSessionIdentityOptions(authOpts)
+
+        if "tlsInfo" in config:
+            tlsInfo = config["tlsInfo"]
+            pk12Blob, pk7Blob = _load_tls(tlsInfo['pk12path'], tlsInfo['pk7path'])
+            sessionOptions.setTlsOptions(bp.TlsOptions.createFromBlobs(pk12Blob, tlsInfo['password'], pk7Blob))
+
+        return sessionOptions
+
+    def _collect_job_start(self, job: ActiveJob, sub_list: bp.SubscriptionList) -> None:
+        """Register a job's instruments and append any new topics to sub_list.
+
+        Caller holds _sub_lock and issues the session.subscribe call.
+        """
+        logger.debug("Starting subscription for job %s with instruments: %s and fields: %s",
+                     job.id, job.instruments, job.fields)
+        job_instruments = []
+        for instrument in job.instruments:
+            # Only subscribe instruments that are not already live
+            if instrument not in self._active_instruments:
+                cid = self._cid_pool.get(instrument)
+                if cid is None:
+                    sub_item = SubscriptionItem(instrument=instrument, jobid=job.id)
+                    cid = bp.CorrelationId(sub_item)
+                    self._cid_pool[instrument] = cid
+                else:
+                    # Re-subscription of a pooled instrument; retarget the job
+                    sub_item = cid.value()
+                    sub_item.jobid = job.id
+                sub_list.add(
+                    topic=instrument,
+                    fields=list(job.fields),
+                    correlationId=cid
+                )
+                self._active_instruments[instrument] = sub_item
+
+            self._instrument_refcount[instrument] = self._instrument_refcount.get(instrument, 0) + 1
+            job_instruments.append(instrument)
+
+        self.active_subscriptions[job.id] = job_instruments
+
+    def _collect_job_stop(self, job_id: int, unsub_list: bp.SubscriptionList) -> None:
+        """Release a job's instruments, appending topics whose refcount hit
+        zero to unsub_list. Caller holds _sub_lock and unsubscribes."""
+        for instrument in self.active_subscriptions[job_id]:
+            # Drop the reference this job held; unsubscribe only when
+            # no other active job still uses the instrument
+            self._instrument_refcount[instrument] -= 1
+            if self._instrument_refcount[instrument] == 0:
+                del self._instrument_refcount[instrument]
+                sub_item = self._active_instruments.pop(instrument)
+                # The pooled CorrelationId stays around for re-subscription
+                unsub_list.add(
+                    security=sub_item.instrument,
+                    correlationId=self._cid_pool[instrument]
+                )
+
+        del self.active_subscriptions[job_id]
+
+    def start_subscription(self, job: ActiveJob) -> None:
         try:
-            job_instruments = []
-            for instrument in job['instruments']:
-                # Create SubscriptionItem for correlation
-                sub_item = SubscriptionItem(instrument=instrument, jobid=job['id'])
-                
-                # Only add to SubscriptionList if not already subscribed
-                if instrument not in self._active_instruments:
-                    self._subscription_list.add(
-                        topic=instrument,
-                        fields=job['fields'],
-                        correlationId=bp.CorrelationId(sub_item)
-                    )
-                    self._active_instruments[instrument] = sub_item
-                
-                job_instruments.append(instrument)
-
-            # If we added any new instruments, subscribe
-            if job_instruments:
-                self._session.subscribe(self._subscription_list)
-            
-            # Store the job's instruments
-            self.active_subscriptions[job['id']] = job_instruments
-            logger.debug(f"Started subscription for job {job['id']}")
-            
+            with self._sub_lock:
+                sub_list = bp.SubscriptionList()
+                self._collect_job_start(job, sub_list)
+                if sub_list.size() > 0:
+                    self._session.subscribe(sub_list)
+            logger.debug("Started subscription for job %s", job.id)
         except Exception as e:
-            logger.error(f"Error starting subscription for job {job['id']}: {str(e)}", exc_info=True)
+            logger.error(f"Error starting subscription for job {job.id}: {str(e)}", exc_info=True)
             raise
 
     def stop_subscription(self, job_id: int) -> None:
         if job_id in self.active_subscriptions:
             logger.info(f"Stopping subscription for job {job_id}")
             try:
-                # Get instruments for this job
-                instruments = self.active_subscriptions[job_id]
-                
-                # Create a list for instruments to unsubscribe
-                to_unsubscribe = []
-                
-                for instrument in instruments:
-                    # Check if instrument is used by other jobs
-                    used_by_others = any(
-                        instrument in job_instruments 
-                        for jid, job_instruments in self.active_subscriptions.items() 
-                        if jid != job_id
-                    )
-                    
-                    if not used_by_others:
-                        # If instrument is not used by other jobs, unsubscribe
-                        to_unsubscribe.append(self._active_instruments[instrument])
-                        del self._active_instruments[instrument]
-
-                # If we have instruments to unsubscribe, create a new SubscriptionList for them
-                if to_unsubscribe:
+                with self._sub_lock:
                     unsub_list = bp.SubscriptionList()
-                    for sub_item in to_unsubscribe:
-                        unsub_list.add(
-                            security=sub_item.instrument,
-                            correlationId=bp.CorrelationId(sub_item)
-                        )
-                    self._session.unsubscribe(unsub_list)
-
-                # Remove job from active subscriptions
-                del self.active_subscriptions[job_id]
-                logger.debug(f"Stopped subscription for job {job_id}")
-
+                    self._collect_job_stop(job_id, unsub_list)
+                    if unsub_list.size() > 0:
+                        self._session.unsubscribe(unsub_list)
+                logger.debug("Stopped subscription for job %s", job_id)
             except Exception as e:
                 logger.error(f"Error stopping subscription for job {job_id}: {str(e)}", exc_info=True)
                 raise
 
+    def reconcile_subscriptions(self) -> None:
+        """Diff the job cache against the active set and issue at most one
+        subscribe and one unsubscribe round-trip per management cycle."""
+        try:
+            with self._sub_lock:
+                to_start = self.job_cache.keys() - self.active_subscriptions.keys()
+                to_stop = self.active_subscriptions.keys() - self.job_cache.keys()
+
+                sub_list = bp.SubscriptionList()
+                for job_id in to_start:
+                    self._collect_job_start(self.job_cache[job_id], sub_list)
+
+                unsub_list = bp.SubscriptionList()
+                for job_id in to_stop:
+                    logger.info(f"Job {job_id} no longer in cache, stopping subscription")
+                    self._collect_job_stop(job_id, unsub_list)
+
+                if sub_list.size() > 0:
+                    self._session.subscribe(sub_list)
+                if unsub_list.size() > 0:
+                    self._session.unsubscribe(unsub_list)
+        except Exception as e:
+            logger.error(f"Error reconciling subscriptions: {str(e)}", exc_info=True)
+
     def eventHandler(self, event: bp.Event, session: bp.Session) -> None:
         try:
             event_type = event.eventType()
             
             if event_type == bp.Event.SUBSCRIPTION_DATA:
+                # Hot path: every correlation id here was created by us, so
+                # the value is always a SubscriptionItem — no isinstance
+                # check. Messages are handed straight to the consumer thread.
                 for msg in event:
                     correlation_id = msg.correlationId()
                     if correlation_id:
                         sub_item = correlation_id.value()
-                        if isinstance(sub_item, SubscriptionItem):
-                            logger.debug(f"Received data for job {sub_item.jobid}, instrument {sub_item.instrument}: {msg}")
-                            # Here you can process the subscription data
-                            for field in msg.asElement().elements():
-                                logger.info(f"Field: {field.name()} = {field.getValueAsString()}")
-                        else:
-                            logger.warning(f"Unexpected correlation ID type: {type(sub_item)}")
-                    else:
-                        logger.debug(f"Received message without correlation ID: {msg}")
-            
+                        self._inbound.put((sub_item.jobid, sub_item.instrument, msg))
+                    elif logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("Received message without correlation ID: %s", msg)
+
             elif event_type == bp.Event.SUBSCRIPTION_STATUS:
                 for msg in event:
                     correlation_id = msg.correlationId()
                     if correlation_id:
                         sub_item = correlation_id.value()
-                        if isinstance(sub_item, SubscriptionItem):
-                            logger.info(f"Subscription status for job {sub_item.jobid}, instrument {sub_item.instrument}: {msg}")
-                        else:
-                            logger.warning(f"Unexpected correlation ID type: {type(sub_item)}")
-            
+                        logger.info("Subscription status for job %s, instrument %s: %s",
+                                    sub_item.jobid, sub_item.instrument, msg)
+
             elif event_type == bp.Event.SESSION_STATUS:
                 for msg in event:
-                    logger.info(f"Session status: {msg}")
-            
-            else:
-                logger.debug(f"Received other event type: {event_type}")
+                    logger.info("Session status: %s", msg)
+
+            elif logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Received other event type: %s", event_type)
                 for msg in event:
-                    logger.debug(f"Message: {msg}")
+                    logger.debug("Message: %s", msg)
 
         except Exception as e:
             logger.error(f"Error in eventHandler: {str(e)}", exc_info=True)
 
+    def _drain_inbound(self) -> None:
+        logger.info("Starting subscription data consumer")
+        while not self.stop_event.is_set():
+            try:
+                item = self._inbound.get(timeout=1)
+            except queue.Empty:
+                continue
+            batch = [item]
+            # Drain whatever else is queued so downstream work (logging now,
+            # batched persistence later) is amortized over many ticks
+            while len(batch) < 500:
+                try:
+                    batch.append(self._inbound.get_nowait())
+                except queue.Empty:
+                    break
+            self._process_batch(batch)
+
+    def _process_batch(self, batch: List[tuple]) -> None:
+        if logger.isEnabledFor(logging.DEBUG):
+            for jobid, instrument, msg in batch:
+                if hasattr(msg, 'toPy'):
+                    # One C-level conversion of the whole message instead of
+                    # per-field Python accessor calls
+                    logger.debug("Received data for job %s, instrument %s: %s",
+                                 jobid, instrument, msg.toPy())
+                else:
+                    logger.debug("Received data for job %s, instrument %s: %s", jobid, instrument, msg)
+                    for field in msg.asElement().elements():
+                        logger.debug("Field: %s = %s", field.name(), field.getValueAsString())
+
     def start(self) -> None:
         logger.info("Starting SubscriptionHandler session")
         self._session.start()
@@ -206,8 +298,11 @@ class SubscriptionHandler:
         logger.info("Stopping SubscriptionHandler")
         try:
             self.stop_event.set()
+            self.update_event.set()  # wake the manager so it can observe the stop
             if self.subscription_thread.is_alive():
                 self.subscription_thread.join()
+            if self._consumer_thread.is_alive():
+                self._consumer_thread.join()
             self.db.close()  # Close the database connection
             if self._session:
                 self._session.stopAsync()
@@ -217,39 +312,42 @@ class SubscriptionHandler:
     def manage_subscriptions(self) -> None:
         logger.info("Starting subscription management")
         while not self.stop_event.is_set():
-            current_time: float = time.time()
-            logger.debug(f"Current time: {current_time}")
-            
-            self.check_for_updates()
-
-            if current_time - self.last_cache_update > self.cache_update_interval:
-                self.update_job_cache(current_time)
-
-            # Process jobs from cache
-            for job_id, job in self.job_cache.items():
-                if job_id not in self.active_subscriptions:
-                    self.start_subscription(job)
-
-            # Stop expired subscriptions
-            for job_id in list(self.active_subscriptions.keys()):
-                if job_id not in self.job_cache:
-                    logger.info(f"Job {job_id} no longer in cache, stopping subscription")
-                    self.stop_subscription(job_id)
-
-            time.sleep(5)  # Still sleep, but now we're using cached data
+            refresh = False
+
+            if self.update_event.is_set():
+                self.update_event.clear()
+                refresh = True
+            elif time.monotonic() >= self._next_refresh:
+                refresh = True
+            elif self.db.check_update_flag():
+                # Fallback for writers that cannot signal the event in-process
+                logger.info("Update flag detected, refreshing job cache")
+                refresh = True
+
+            if refresh:
+                self.update_job_cache(time.time())
+                self.db.clear_update_flag()
+                self.reconcile_subscriptions()
+
+            # Sleep until a change event or the next refresh deadline; an
+            # explicit poll_interval caps the sleep so the DB flag is still
+            # polled at that cadence
+            timeout = max(0.0, self._next_refresh - time.monotonic())
+            if self.poll_interval is not None:
+                timeout = min(timeout, self.poll_interval)
+            self.update_event.wait(timeout)
+
+    def notify_change(self) -> None:
+        logger.debug("Change notification received, waking subscription manager")
+        self.update_event.set()
 
     def update_job_cache(self, current_time: float) -> None:
-        logger.debug(f"Updating job cache at {current_time}")
-        jobs: List[Dict[str, Any]] = self.db.query_active_jobs(current_time)
-        logger.debug(f"Jobs: {jobs}")
-        self.job_cache = {job['id']: job for job in jobs}
+        logger.debug("Updating job cache at %s", current_time)
+        jobs: List[ActiveJob] = self.db.query_active_jobs(current_time)
+        logger.debug("Jobs: %s", jobs)
+        self.job_cache = {job.id: job for job in jobs}
         self.last_cache_update = current_time
-
-    def check_for_updates(self) -> None:
-        if self.db.check_update_flag():
-            logger.info("Update flag detected, refreshing job cache")
-            self.update_job_cache(time.time())
-            self.db.clear_update_flag()
+        self._next_refresh = time.monotonic() + self.cache_update_interval
 
     def __del__(self) -> None:
         logger.info("Stopping SubscriptionHandler session")
@@ -260,7 +358,7 @@ class SubscriptionHandler:
             logger.error(f"Error stopping SubscriptionHandler session: {str(e)}", exc_info=True)
 
 if __name__ == "__main__":
-    handler = SubscriptionHandler("config/bpipe_config.json")
+    handler = SubscriptionHandler.get_instance("config/bpipe_config.json")
     handler.start()
     try:
         while True:
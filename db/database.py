@@ -1,104 +1,258 @@
 import sqlite3
-from typing import List, Tuple, Optional, Dict, Any
+import queue
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import List, Tuple, Optional, Dict
 import pandas as pd
-import json
 import threading
 from components.logger_config import get_logger
+from models.activejob import ActiveJob
 
 logger = get_logger(__name__)
 
+# SQL is defined once at module level so sqlite3's per-connection statement
+# cache is always keyed on the same string object and the planner runs once
+_SQL_QUERY_RECENT = '''
+    SELECT j.job_id, j.job_name,
+           j.job_startdatetime,
+           j.job_status,
+           COALESCE(c.instrument_count, 0) AS instrument_count,
+           COALESCE(c.field_count, 0) AS field_count
+    FROM jobs j
+    LEFT JOIN job_counts c ON c.job_id = j.job_id
+    ORDER BY j.job_id DESC
+    LIMIT ?
+'''
+
+# Trigger-maintained roll-up of child-row counts per job; reads become a
+# point lookup instead of a COUNT aggregate over the child tables
+_SQL_SCHEMA_JOB_COUNTS = (
+    '''CREATE TABLE IF NOT EXISTS job_counts (
+        job_id INTEGER PRIMARY KEY,
+        instrument_count INTEGER NOT NULL DEFAULT 0,
+        field_count INTEGER NOT NULL DEFAULT 0
+    )''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_instruments_ins AFTER INSERT ON instruments
+    BEGIN
+        INSERT INTO job_counts(job_id, instrument_count, field_count)
+        VALUES (NEW.job_id, 1, 0)
+        ON CONFLICT(job_id) DO UPDATE SET instrument_count = instrument_count + 1;
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_instruments_del AFTER DELETE ON instruments
+    BEGIN
+        UPDATE job_counts SET instrument_count = instrument_count - 1
+        WHERE job_id = OLD.job_id;
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_fields_ins AFTER INSERT ON fields
+    BEGIN
+        INSERT INTO job_counts(job_id, instrument_count, field_count)
+        VALUES (NEW.job_id, 0, 1)
+        ON CONFLICT(job_id) DO UPDATE SET field_count = field_count + 1;
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_fields_del AFTER DELETE ON fields
+    BEGIN
+        UPDATE job_counts SET field_count = field_count - 1
+        WHERE job_id = OLD.job_id;
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_jobs_del AFTER DELETE ON jobs
+    BEGIN
+        DELETE FROM job_counts WHERE job_id = OLD.job_id;
+    END''',
+)
+
+_SQL_BACKFILL_JOB_COUNTS = '''
+    INSERT INTO job_counts (job_id, instrument_count, field_count)
+    SELECT j.job_id, COALESCE(i.cnt, 0), COALESCE(f.cnt, 0)
+    FROM jobs j
+    LEFT JOIN (SELECT job_id, COUNT(*) AS cnt FROM instruments GROUP BY job_id) i ON i.job_id = j.job_id
+    LEFT JOIN (SELECT job_id, COUNT(*) AS cnt FROM fields GROUP BY job_id) f ON f.job_id = j.job_id
+'''
+
+_SQL_INSERT_JOB = '''
+    INSERT INTO jobs (job_name, job_startdatetime, duration, job_status)
+    VALUES (?, ?, ?, ?)
+'''
+
+_SQL_INSERT_INSTRUMENT = '''
+    INSERT INTO instruments (instrument_name, job_id)
+    VALUES (?, ?)
+'''
+
+_SQL_INSERT_FIELD = '''
+    INSERT INTO fields (field_name, job_id)
+    VALUES (?, ?)
+'''
+
+_SQL_QUERY_ACTIVE_JOBS = """
+    SELECT job_id, job_name, job_startdatetime, job_enddatetime
+    FROM v_active_jobs
+    WHERE job_startdatetime <= ? AND job_enddatetime > ?
+"""
+
+# Canonical projection for active-job lookups; the time-range predicate
+# stays parameterized in _SQL_QUERY_ACTIVE_JOBS since views cannot bind
+_SQL_SCHEMA_ACTIVE_VIEW = '''
+    CREATE VIEW IF NOT EXISTS v_active_jobs AS
+    SELECT job_id, job_name, job_startdatetime, job_enddatetime
+    FROM jobs
+'''
+
 class Database:
     def __init__(self, db_path: str):
         self.db_path: str = db_path
         self._local = threading.local()
+        # TTL cache for query_active_jobs; invalidated by set_update_flag
+        # and by the update flag set from other processes
+        self._active_cache: Tuple[float, List[ActiveJob]] = (0.0, [])
+        self._active_cache_ttl: int = 30
+        self._cache_lock = threading.Lock()
+        # Change detection rides on PRAGMA user_version: writers bump it,
+        # readers compare against the version they last acknowledged
+        self._last_seen_version: Optional[int] = None
+        # Memoized recent-jobs frames keyed by limit, valid for one
+        # data_version; writers bumping user_version invalidate them
+        self._recent_cache: Dict[int, pd.DataFrame] = {}
+        self._recent_cache_version: Optional[int] = None
+        # Bounded pool of read-only connections; under WAL these serve
+        # queries in parallel with writes on the per-thread RW connections
+        self._reader_pool: queue.Queue = queue.Queue(maxsize=4)
+        self._reader_count: int = 0
+        self._reader_lock = threading.Lock()
+        self._ensure_schema()
 
     @property
     def conn(self) -> sqlite3.Connection:
         if not hasattr(self._local, 'conn'):
             try:
-                self._local.conn = sqlite3.connect(self.db_path)
+                # Autocommit mode; multi-statement writes take an explicit
+                # BEGIN IMMEDIATE so the write lock is acquired up front
+                self._local.conn = sqlite3.connect(self.db_path, isolation_level=None,
+                                                   cached_statements=512)
+                # C-implemented mapping rows; avoids building dicts per row
+                self._local.conn.row_factory = sqlite3.Row
+                # WAL lets the UI thread read while the subscription handler
+                # writes; synchronous=NORMAL drops the redundant second fsync
+                self._local.conn.execute('PRAGMA journal_mode=WAL')
+                self._local.conn.execute('PRAGMA synchronous=NORMAL')
+                self._local.conn.execute('PRAGMA temp_store=MEMORY')
+                self._local.conn.execute('PRAGMA mmap_size=268435456')
+                self._local.conn.execute('PRAGMA cache_size=-20000')
+                self._local.conn.execute('PRAGMA foreign_keys=ON')
                 logger.debug(f"Created new database connection for thread {threading.get_ident()}")
             except sqlite3.Error as e:
                 logger.error(f"Error creating database connection: {e}", exc_info=True)
                 raise
         return self._local.conn
 
-    def _execute_query(self, query: str, params: Tuple = ()) -> List[Tuple]:
+    def _ensure_schema(self) -> None:
+        # Idempotent bootstrap run once from __init__, before any reader
+        # threads exist, so index creation never races another connection.
+        # Without these indexes SQLite builds a transient auto-index for
+        # every join on the child tables.
         try:
-            cursor = self.conn.cursor()
-            cursor.execute(query, params)
-            #logger.debug(f"Executed query: {query}")
-            return cursor.fetchall()
+            # Databases created before the generated end-time column need it
+            # added so the active-jobs range predicate is indexable. ALTER
+            # TABLE can only add VIRTUAL generated columns, not STORED ones
+            # table_xinfo, not table_info: only the former lists generated columns
+            columns = {row[1] for row in self.conn.execute('PRAGMA table_xinfo(jobs)')}
+            if 'job_enddatetime' not in columns:
+                self.conn.execute(
+                    'ALTER TABLE jobs ADD COLUMN job_enddatetime INTEGER '
+                    'GENERATED ALWAYS AS (job_startdatetime + duration * 60) VIRTUAL')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_instruments_job_id ON instruments(job_id)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_fields_job_id ON fields(job_id)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_startdt ON jobs(job_startdatetime)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_enddt ON jobs(job_enddatetime)')
+            # Roll-up table and its triggers; backfill from the child tables
+            # when the table is first introduced on an existing database
+            had_counts = self.conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name='job_counts'").fetchone()
+            for statement in _SQL_SCHEMA_JOB_COUNTS:
+                self.conn.execute(statement)
+            if not had_counts:
+                self.conn.execute(_SQL_BACKFILL_JOB_COUNTS)
+            self.conn.execute(_SQL_SCHEMA_ACTIVE_VIEW)
         except sqlite3.Error as e:
-            logger.error(f"Error executing query: {query}. Error: {e}", exc_info=True)
+            logger.error(f"Error ensuring schema: {e}", exc_info=True)
             raise
 
-    def _execute_command(self, command: str, params: Tuple = ()) -> None:
+    @contextmanager
+    def _reader(self):
         try:
-            cursor = self.conn.cursor()
-            cursor.execute(command, params)
-            self.conn.commit()
-            logger.debug(f"Executed command: {command}")
-        except sqlite3.Error as e:
-            logger.error(f"Error executing command: {command}. Error: {e}", exc_info=True)
-            raise
+            conn = self._reader_pool.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._reader_lock:
+                if self._reader_count < self._reader_pool.maxsize:
+                    self._reader_count += 1
+                    # Make sure a RW connection has put the file into WAL
+                    # before a read-only connection tries to open it
+                    self.conn
+                    conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True,
+                                           check_same_thread=False, cached_statements=512)
+                    conn.row_factory = sqlite3.Row
+                    conn.execute('PRAGMA cache_size=-20000')
+                    logger.debug("Created new read-only database connection")
+            if conn is None:
+                conn = self._reader_pool.get()
+        try:
+            yield conn
+        finally:
+            self._reader_pool.put(conn)
 
     def query_recent_jobs(self, limit: int = 5) -> pd.DataFrame:
+        version = self.data_version()
+        with self._cache_lock:
+            if version != self._recent_cache_version:
+                self._recent_cache.clear()
+                self._recent_cache_version = version
+            cached = self._recent_cache.get(limit)
+            if cached is not None:
+                logger.debug("Returning cached recent jobs")
+                return cached.copy()
+        df = self._query_recent_jobs_impl(limit)
+        with self._cache_lock:
+            if version == self._recent_cache_version:
+                self._recent_cache[limit] = df
+        return df.copy()
+
+    def _query_recent_jobs_impl(self, limit: int) -> pd.DataFrame:
         logger.info(f"Querying {limit} recent jobs")
-        query = '''
-            SELECT jobs.job_id, jobs.job_name, 
-                   strftime('%Y-%m-%d %H:%M:%S', job_startdatetime, 'unixepoch') AS job_startdatetime, 
-                   job_status, 
-                   (SELECT COUNT(*) FROM instruments WHERE instruments.job_id = jobs.job_id) AS instrument_count, 
-                   (SELECT COUNT(*) FROM fields WHERE fields.job_id = jobs.job_id) AS field_count 
-            FROM jobs 
-            ORDER BY jobs.job_id DESC
-            LIMIT ?
-        '''
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                df = pd.read_sql_query(query, conn, params=(limit,))
+            with self._reader() as conn:
+                cursor = conn.execute(_SQL_QUERY_RECENT, (limit,))
+                rows = [tuple(row) for row in cursor.fetchall()]
+                columns = [description[0] for description in cursor.description]
+            df = pd.DataFrame.from_records(rows, columns=columns)
+            # Vectorized timestamp formatting instead of a per-row Python loop
+            df['job_startdatetime'] = pd.to_datetime(
+                df['job_startdatetime'], unit='s').dt.strftime('%Y-%m-%d %H:%M:%S')
             return df
-        except (sqlite3.Error, pd.io.sql.DatabaseError) as e:
+        except sqlite3.Error as e:
             logger.error(f"Error querying recent jobs: {e}", exc_info=True)
             raise
 
     def insert_job(self, job_name: str, job_startdatetime: int, duration: int, job_status: str) -> int:
         logger.info(f"Inserting new job: {job_name}")
-        query = '''
-            INSERT INTO jobs (job_name, job_startdatetime, duration, job_status)
-            VALUES (?, ?, ?, ?)
-        '''
         try:
-            cursor = self.conn.cursor()
-            cursor.execute(query, (job_name, job_startdatetime, duration, job_status))
+            cursor = self.conn.execute(_SQL_INSERT_JOB, (job_name, job_startdatetime, duration, job_status))
             return cursor.lastrowid
         except sqlite3.Error as e:
             logger.error(f"Error inserting job: {job_name}. Error: {e}", exc_info=True)
             raise
 
     def insert_instruments(self, instruments: List[str], job_id: int) -> None:
-        query = '''
-            INSERT INTO instruments (instrument_name, job_id)
-            VALUES (?, ?)
-        '''
         try:
-            cursor = self.conn.cursor()
-            for instrument in instruments:
-                cursor.execute(query, (instrument.strip(), job_id))
+            params = [(s, job_id) for s in map(str.strip, instruments) if s]
+            self.conn.executemany(_SQL_INSERT_INSTRUMENT, params)
         except sqlite3.Error as e:
             logger.error(f"Error inserting instruments for job_id {job_id}. Error: {e}", exc_info=True)
             raise
 
     def insert_fields(self, fields: List[str], job_id: int) -> None:
-        query = '''
-            INSERT INTO fields (field_name, job_id)
-            VALUES (?, ?)
-        '''
         try:
-            cursor = self.conn.cursor()
-            for field in fields:
-                cursor.execute(query, (field.strip(), job_id))
+            params = [(s, job_id) for s in map(str.strip, fields) if s]
+            self.conn.executemany(_SQL_INSERT_FIELD, params)
         except sqlite3.Error as e:
             logger.error(f"Error inserting fields for job_id {job_id}. Error: {e}", exc_info=True)
             raise
@@ -106,89 +260,152 @@ class Database:
     def insert_data(self, job_name: str, job_startdatetime: int, job_enddatetime: int, 
                     instruments: List[str], fields: List[str]) -> None:
         try:
-            duration = int((job_enddatetime - job_startdatetime) / 60)  # Calculate duration in minutes
-            job_id = self.insert_job(job_name, job_startdatetime, duration, "NOT STARTED")
-            self.insert_instruments(instruments, job_id)
-            self.insert_fields(fields, job_id)
+            duration = (job_enddatetime - job_startdatetime) // 60  # Calculate duration in minutes
+            # Single transaction so the job and its child rows commit with one fsync
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                job_id = self.insert_job(job_name, job_startdatetime, duration, "NOT STARTED")
+                self.insert_instruments(instruments, job_id)
+                self.insert_fields(fields, job_id)
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
         except Exception as e:
             logger.error(f"Error inserting data for job: {job_name}. Error: {e}", exc_info=True)
             raise
 
     def delete_job(self, job_id: int) -> None:
-        logger.info(f"Deleting job with ID: {job_id}")
-        query = "DELETE FROM jobs WHERE job_id = ?"
+        self.delete_jobs([job_id])
+
+    def delete_jobs(self, job_ids: List[int]) -> None:
+        if not job_ids:
+            return
+        logger.info(f"Deleting jobs with IDs: {job_ids}")
+        placeholders = ','.join('?' * len(job_ids))
         try:
-            cursor = self.conn.cursor()
-            cursor.execute(query, (job_id,))
+            # One transaction: child rows first so the parent delete cannot
+            # leave orphans, then the jobs themselves
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                self.conn.execute(f"DELETE FROM instruments WHERE job_id IN ({placeholders})", job_ids)
+                self.conn.execute(f"DELETE FROM fields WHERE job_id IN ({placeholders})", job_ids)
+                self.conn.execute(f"DELETE FROM jobs WHERE job_id IN ({placeholders})", job_ids)
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
         except sqlite3.Error as e:
-            logger.error(f"Error deleting job with ID {job_id}. Error: {e}", exc_info=True)
+            logger.error(f"Error deleting jobs with IDs {job_ids}. Error: {e}", exc_info=True)
             raise
 
-    def query_active_jobs(self, current_time: float) -> List[Dict[str, Any]]:
+    def query_active_jobs(self, current_time: float) -> List[ActiveJob]:
+        with self._cache_lock:
+            cached_at, cached = self._active_cache
+            if current_time - cached_at < self._active_cache_ttl and not self.check_update_flag():
+                logger.debug("Returning cached active jobs")
+                return cached
+
         logger.info(f"Querying active jobs at time: {current_time}")
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("""
-                SELECT j.job_id, j.job_name, j.job_startdatetime, j.job_startdatetime + j.duration * 60 as job_enddatetime,
-                       GROUP_CONCAT(DISTINCT i.instrument_name) as instruments,
-                       GROUP_CONCAT(DISTINCT f.field_name) as fields
-                FROM jobs j
-                LEFT JOIN instruments i ON j.job_id = i.job_id
-                LEFT JOIN fields f ON j.job_id = f.job_id
-                WHERE j.job_startdatetime <= ? AND j.job_startdatetime + j.duration * 60 > ?
-                GROUP BY j.job_id
-            """, (current_time, current_time))
-            rows = cursor.fetchall()
-
-            return [
-                {
-                    'id': row[0],
-                    'job_name': row[1],
-                    'job_startdatetime': row[2],
-                    'job_enddatetime': row[3],
-                    'instruments': row[4].split(',') if row[4] else [],
-                    'fields': row[5].split(',') if row[5] else []
-                }
+            with self._reader() as conn:
+                rows = conn.execute(_SQL_QUERY_ACTIVE_JOBS, (current_time, current_time)).fetchall()
+                if not rows:
+                    with self._cache_lock:
+                        self._active_cache = (current_time, [])
+                    return []
+
+                # Fetch child rows for the active jobs in two indexed IN queries
+                # and bucket in Python; GROUP_CONCAT + split would break on any
+                # name containing a comma
+                job_ids = [row['job_id'] for row in rows]
+                placeholders = ','.join('?' * len(job_ids))
+                instruments_by_job: Dict[int, List[str]] = defaultdict(list)
+                for job_id, name in conn.execute(
+                        f"SELECT job_id, instrument_name FROM instruments WHERE job_id IN ({placeholders})", job_ids):
+                    instruments_by_job[job_id].append(name)
+                fields_by_job: Dict[int, List[str]] = defaultdict(list)
+                for job_id, name in conn.execute(
+                        f"SELECT job_id, field_name FROM fields WHERE job_id IN ({placeholders})", job_ids):
+                    fields_by_job[job_id].append(name)
+
+            # Immutable slotted rows: cheaper than per-row dicts and safe to
+            # share across cache epochs
+            jobs = [
+                ActiveJob(
+                    id=row['job_id'],
+                    job_name=row['job_name'],
+                    job_startdatetime=row['job_startdatetime'],
+                    job_enddatetime=row['job_enddatetime'],
+                    instruments=tuple(instruments_by_job[row['job_id']]),
+                    fields=tuple(fields_by_job[row['job_id']])
+                )
                 for row in rows
             ]
+            with self._cache_lock:
+                self._active_cache = (current_time, jobs)
+            return jobs
         except sqlite3.Error as e:
             logger.error(f"Error querying active jobs. Error: {e}", exc_info=True)
             raise
 
     def close(self) -> None:
+        # Drain and close pooled readers first so the checkpoint below can
+        # truncate the WAL without live readers pinning it
+        with self._reader_lock:
+            while True:
+                try:
+                    self._reader_pool.get_nowait().close()
+                    self._reader_count -= 1
+                except queue.Empty:
+                    break
         if hasattr(self._local, 'conn'):
             try:
+                # Fold the WAL back into the main database before closing
+                self._local.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
                 self._local.conn.close()
                 delattr(self._local, 'conn')
                 logger.info(f"Closed database connection for thread {threading.get_ident()}")
             except sqlite3.Error as e:
                 logger.error(f"Error closing database connection: {e}", exc_info=True)
 
-    def __del__(self) -> None:
+    def __enter__(self) -> 'Database':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
         self.close()
 
+    def data_version(self) -> int:
+        return self.conn.execute("PRAGMA user_version").fetchone()[0]
+
     def set_update_flag(self) -> None:
         logger.info("Setting update flag")
         try:
-            self._execute_command("UPDATE metadata SET value = 1 WHERE key = 'update_flag'")
+            with self._cache_lock:
+                self._active_cache = (0.0, [])
+            # PRAGMA stores the counter in the DB header: no table access,
+            # no transaction, visible to every process on the file
+            self.conn.execute(f"PRAGMA user_version = {self.data_version() + 1}")
         except sqlite3.Error as e:
             logger.error(f"Error setting update flag: {e}", exc_info=True)
             raise
 
     def check_update_flag(self) -> bool:
         try:
-            result = self._execute_query("SELECT value FROM metadata WHERE key = 'update_flag'")
-            flag_value = result[0][0] == 1 if result else False
-            logger.debug(f"Checked update flag, value: {flag_value}")
-            return flag_value
+            version = self.data_version()
+            changed = self._last_seen_version is not None and version != self._last_seen_version
+            if self._last_seen_version is None:
+                self._last_seen_version = version
+            logger.debug(f"Checked update flag, value: {changed}")
+            return changed
         except sqlite3.Error as e:
             logger.error(f"Error checking update flag: {e}", exc_info=True)
             raise
 
     def clear_update_flag(self) -> None:
-        logger.info("Clearing update flag")
+        logger.debug("Clearing update flag")
         try:
-            self._execute_command("UPDATE metadata SET value = 0 WHERE key = 'update_flag'")
+            self._last_seen_version = self.data_version()
         except sqlite3.Error as e:
             logger.error(f"Error clearing update flag: {e}", exc_info=True)
             raise
@@ -2,20 +2,24 @@ DROP TABLE IF EXISTS instruments;
 DROP TABLE IF EXISTS fields;
 DROP TABLE IF EXISTS jobs;
 DROP TABLE IF EXISTS metadata;
+DROP TABLE IF EXISTS job_counts;
+DROP VIEW IF EXISTS v_active_jobs;
 -- Create table jobs
 CREATE TABLE jobs (
     job_id INTEGER PRIMARY KEY AUTOINCREMENT,
     job_name TEXT NOT NULL,
     job_startdatetime INTEGER NOT NULL,
     duration INTEGER NOT NULL,
-    job_status TEXT CHECK(job_status IN ('NOT STARTED', 'RUNNING', 'COMPLETED', 'FAILED')) NOT NULL
+    job_status TEXT CHECK(job_status IN ('NOT STARTED', 'RUNNING', 'COMPLETED', 'FAILED')) NOT NULL,
+    -- Virtual column so the active-jobs range predicate is indexable
+    job_enddatetime INTEGER GENERATED ALWAYS AS (job_startdatetime + duration * 60) VIRTUAL
 );
 
 -- Create table instruments
 CREATE TABLE instruments (
     instrument_name TEXT NOT NULL,
     job_id INTEGER,
-    FOREIGN KEY (job_id) REFERENCES jobs(job_id),
+    FOREIGN KEY (job_id) REFERENCES jobs(job_id) ON DELETE CASCADE,
     UNIQUE (instrument_name, job_id)
 );
 
@@ -23,12 +27,60 @@ CREATE TABLE instruments (
 CREATE TABLE fields (
     field_name TEXT NOT NULL,
     job_id INTEGER,
-    FOREIGN KEY (job_id) REFERENCES jobs(job_id),
+    FOREIGN KEY (job_id) REFERENCES jobs(job_id) ON DELETE CASCADE,
     UNIQUE (field_name, job_id)
 );
 
--- Create table metadata
-CREATE TABLE metadata (
-    key TEXT PRIMARY KEY,
-    value INTEGER NOT NULL
-);
\ No newline at end of file
+-- Change notifications ride on PRAGMA user_version (see db/database.py);
+-- the old metadata flag table is gone and just dropped above if present.
+
+-- Per-job child-row counts maintained by triggers so the recent-jobs
+-- query reads a roll-up row instead of aggregating the child tables
+CREATE TABLE IF NOT EXISTS job_counts (
+    job_id INTEGER PRIMARY KEY,
+    instrument_count INTEGER NOT NULL DEFAULT 0,
+    field_count INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_instruments_ins AFTER INSERT ON instruments
+BEGIN
+    INSERT INTO job_counts(job_id, instrument_count, field_count)
+    VALUES (NEW.job_id, 1, 0)
+    ON CONFLICT(job_id) DO UPDATE SET instrument_count = instrument_count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_instruments_del AFTER DELETE ON instruments
+BEGIN
+    UPDATE job_counts SET instrument_count = instrument_count - 1
+    WHERE job_id = OLD.job_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_fields_ins AFTER INSERT ON fields
+BEGIN
+    INSERT INTO job_counts(job_id, instrument_count, field_count)
+    VALUES (NEW.job_id, 0, 1)
+    ON CONFLICT(job_id) DO UPDATE SET field_count = field_count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_fields_del AFTER DELETE ON fields
+BEGIN
+    UPDATE job_counts SET field_count = field_count - 1
+    WHERE job_id = OLD.job_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_jobs_del AFTER DELETE ON jobs
+BEGIN
+    DELETE FROM job_counts WHERE job_id = OLD.job_id;
+END;
+
+-- Canonical projection used by the active-jobs poll in db/database.py
+CREATE VIEW IF NOT EXISTS v_active_jobs AS
+SELECT job_id, job_name, job_startdatetime, job_enddatetime
+FROM jobs;
+
+-- Indexes so per-job lookups in instruments/fields are point lookups
+-- and the active-jobs range predicate can seek on start time
+CREATE INDEX IF NOT EXISTS idx_instruments_job_id ON instruments(job_id);
+CREATE INDEX IF NOT EXISTS idx_fields_job_id ON fields(job_id);
+CREATE INDEX IF NOT EXISTS idx_jobs_startdt ON jobs(job_startdatetime);
+CREATE INDEX IF NOT EXISTS idx_jobs_enddt ON jobs(job_enddatetime);
\ No newline at end of file
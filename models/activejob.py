@@ -0,0 +1,10 @@
+from typing import NamedTuple, Tuple
+
+
+class ActiveJob(NamedTuple):
+    id: int
+    job_name: str
+    job_startdatetime: int
+    job_enddatetime: int
+    instruments: Tuple[str, ...]
+    fields: Tuple[str, ...]